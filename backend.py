@@ -1,13 +1,23 @@
+import functools
+import logging
 import os
+import queue
 import sqlite3
+import threading
+import time
 import uuid
+from contextlib import asynccontextmanager, contextmanager
 from datetime import datetime
+from types import MappingProxyType
+import anyio
+import numpy as np
 import pandas as pd
+from numba import njit
 from fastapi import FastAPI, Depends, HTTPException, UploadFile, File, Form, Request
-# NOTE: Added Response import for the PDF endpoint
-from fastapi.responses import Response 
+from fastapi.concurrency import run_in_threadpool
+# NOTE: StreamingResponse serves the pooled PDF buffers
+from fastapi.responses import StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.security import OAuth2PasswordBearer
 from jose import JWTError, jwt
 from pydantic import BaseModel, Field
 import uvicorn
@@ -19,20 +29,45 @@ from reportlab.graphics import renderPDF
 from reportlab.graphics.shapes import Drawing
 from reportlab.graphics.charts.piecharts import Pie
 from reportlab.lib.colors import HexColor
-from prophet import Prophet
 
 # --- Configuration ---
 DATABASE_URL = os.getenv("DATABASE_URL", "/tmp/emissions.db")
+# Drops all stored emissions on startup. Only for single-process development runs:
+# every worker runs init_db, so under gunicorn each one would wipe the table as it boots.
+RESET_DB = os.getenv("RESET_DB", "").lower() in ("1", "true", "yes")
 SECRET_KEY = os.getenv("SECRET_KEY", "your-secret-key")
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
+UPLOAD_CHUNK_ROWS = 50_000
+FORECAST_CACHE_SIZE = 128
+SUMMARY_CACHE_SIZE = 256
+# Series up to this many points use the NumPy forecaster; longer ones use Prophet
+SIMPLE_FORECAST_MAX_POINTS = 200
+PDF_BUFFER_POOL_SIZE = 16
+PDF_STREAM_CHUNK_BYTES = 64 * 1024
+THREADPOOL_TOKENS = 200
+# Upper bound on open SQLite connections; each may hold a 64 MiB page cache
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", 8))
 origins = ["*"]
 
+logger = logging.getLogger("uvicorn.error")
+
 # --- FastAPI App Initialization ---
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Blocking DB and pandas work runs in the threadpool, so give it more room than anyio's default 40
+    anyio.to_thread.current_default_thread_limiter().total_tokens = THREADPOOL_TOKENS
+    init_db()
+    warm_scenario_sum()
+    warm_pwd_context()
+    yield
+    close_all_conns()
+
 app = FastAPI(
     title="GreenpulseNG API",
     description="API for Nigerian carbon emissions tracking.",
-    version="2.0.0"
+    version="2.0.0",
+    lifespan=lifespan
 )
 
 app.add_middleware(
@@ -59,70 +94,150 @@ def ping():
 
 
 # --- Security ---
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
-oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
+# Argon2id at OWASP's minimum profile; bcrypt stays listed so older hashes still verify
+pwd_context = CryptContext(
+    schemes=["argon2", "bcrypt"],
+    deprecated="auto",
+    argon2__memory_cost=19456,
+    argon2__time_cost=2,
+    argon2__parallelism=1,
+)
+
+def warm_pwd_context():
+    """Load the hashing backend and log the cost of one hash."""
+    start = time.perf_counter()
+    pwd_context.hash("benchmark")
+    logger.info("Password hashing (%s) takes %.1f ms", pwd_context.default_scheme(), (time.perf_counter() - start) * 1000)
 
 class DevUser(BaseModel):
     id: int = 1
     username: str = "dev"
 
-async def current_active_user(token: str = Depends(oauth2_scheme)):
-    # This is a mock authentication for development
-    return DevUser()
+DEV_USER = DevUser()
+
+async def current_active_user() -> DevUser:
+    # This is a mock authentication for development. It is kept a coroutine with no
+    # sub-dependencies: FastAPI awaits it inline, whereas a plain def would be
+    # dispatched to the threadpool, and no Authorization header is parsed.
+    return DEV_USER
 
 # --- Database Setup ---
-def get_conn():
-    conn = sqlite3.connect(DATABASE_URL)
+SQLITE_PRAGMAS = (
+    "PRAGMA journal_mode=WAL;",
+    "PRAGMA synchronous=NORMAL;",
+    "PRAGMA temp_store=MEMORY;",
+    "PRAGMA cache_size=-65536;",
+)
+
+_idle_conns = queue.LifoQueue()
+_conn_slots = threading.BoundedSemaphore(DB_POOL_SIZE)
+
+def _connect():
+    # Pooled connections move between threadpool threads
+    conn = sqlite3.connect(DATABASE_URL, check_same_thread=False)
     conn.row_factory = sqlite3.Row
+    for pragma in SQLITE_PRAGMAS:
+        conn.execute(pragma)
     return conn
 
+@contextmanager
+def get_conn():
+    """Check a long-lived SQLite connection out of the pool for the duration of the block.
+
+    At most DB_POOL_SIZE connections ever exist; further callers wait for one to be
+    returned, so checkouts must not be nested.
+    """
+    _conn_slots.acquire()
+    try:
+        try:
+            conn = _idle_conns.get_nowait()
+        except queue.Empty:
+            conn = _connect()
+        try:
+            yield conn
+        finally:
+            if conn.in_transaction:
+                conn.rollback()
+            _idle_conns.put(conn)
+    finally:
+        _conn_slots.release()
+
+def close_all_conns():
+    while True:
+        try:
+            conn = _idle_conns.get_nowait()
+        except queue.Empty:
+            break
+        try:
+            # Refresh planner statistics so the emissions indexes keep being chosen
+            conn.execute("PRAGMA optimize;")
+        finally:
+            conn.close()
+
 def init_db():
-    conn = get_conn()
-    cursor = conn.cursor()
+    # One transaction for the whole schema setup; DDL does not open one implicitly.
+    # IMMEDIATE takes the write lock up front, so workers starting together queue
+    # on the busy timeout instead of failing to upgrade a read lock mid-migration.
+    with get_conn() as conn, conn:
+        cursor = conn.cursor()
+        cursor.execute("BEGIN IMMEDIATE;")
+
+        if RESET_DB:
+            cursor.execute("DROP TABLE IF EXISTS emissions;")
     
-    # Drop old table if it exists
-    cursor.execute("DROP TABLE IF EXISTS emissions;")
+        # Tables created before emissions_kgCO2e became a generated column are rebuilt in place
+        existing_columns = {row['name']: row['hidden'] for row in cursor.execute("PRAGMA table_xinfo(emissions);")}
+        rebuild = existing_columns.get('emissions_kgCO2e') == 0
+        if rebuild:
+            cursor.execute("ALTER TABLE emissions RENAME TO emissions_old;")
+
+        # Create emissions table
+        cursor.execute("""
+        CREATE TABLE IF NOT EXISTS emissions (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            business_id TEXT NOT NULL,
+            business_type TEXT,
+            date TEXT,
+            source_category TEXT,
+            activity TEXT,
+            amount REAL,
+            unit TEXT,
+            emission_factor REAL,
+            emissions_kgCO2e REAL GENERATED ALWAYS AS (amount * emission_factor) STORED,
+            scope TEXT,
+            user_id TEXT
+        );
+        """)
+
+        if rebuild:
+            # Tables written by pandas' to_sql have no id column; AUTOINCREMENT assigns fresh ones
+            input_columns = ("id", "business_id", "business_type", "date", "source_category", "activity", "amount", "unit", "emission_factor", "scope", "user_id")
+            copied_columns = ", ".join(col for col in input_columns if col in existing_columns)
+            cursor.execute(f"INSERT INTO emissions ({copied_columns}) SELECT {copied_columns} FROM emissions_old;")
+            cursor.execute("DROP TABLE emissions_old;")
+
+        # Indexes backing the per-business, per-sector and per-date lookups
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_emissions_biz_user ON emissions(business_id, user_id);")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_emissions_btype ON emissions(business_type);")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_emissions_date ON emissions(date);")
     
-    # Create new emissions table
-    cursor.execute("""
-    CREATE TABLE IF NOT EXISTS emissions (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        business_id TEXT NOT NULL,
-        business_type TEXT,
-        date TEXT,
-        source_category TEXT,
-        activity TEXT,
-        amount REAL,
-        unit TEXT,
-        emission_factor REAL,
-        emissions_kgCO2e REAL,
-        scope TEXT,
-        user_id TEXT
-    );
-    """)
-    
-    # Create users and shares table if they don't exist
-    cursor.execute("""
-    CREATE TABLE IF NOT EXISTS users (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        username TEXT UNIQUE NOT NULL,
-        hashed_password TEXT NOT NULL
-    );
-    """)
-    cursor.execute("""
-    CREATE TABLE IF NOT EXISTS shares (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        token TEXT UNIQUE NOT NULL,
-        business_id TEXT NOT NULL,
-        user_id TEXT NOT NULL,
-        created_at TEXT NOT NULL
-    );
-    """)
-    conn.commit()
-    conn.close()
-
-# Initialize DB on startup
-init_db()
+        # Create users and shares table if they don't exist
+        cursor.execute("""
+        CREATE TABLE IF NOT EXISTS users (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            username TEXT UNIQUE NOT NULL,
+            hashed_password TEXT NOT NULL
+        );
+        """)
+        cursor.execute("""
+        CREATE TABLE IF NOT EXISTS shares (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            token TEXT UNIQUE NOT NULL,
+            business_id TEXT NOT NULL,
+            user_id TEXT NOT NULL,
+            created_at TEXT NOT NULL
+        );
+        """)
 
 # --- Pydantic Models ---
 class ManualEntry(BaseModel):
@@ -147,196 +262,424 @@ class ShareCreateRequest(BaseModel):
     business_id: str
 
 # --- Helper Functions ---
+_RECOMMENDATIONS = MappingProxyType({
+    "electricity": "Consider installing solar panels to reduce reliance on the grid.",
+    "transport": "Optimize delivery routes and consider using more fuel-efficient vehicles.",
+    "waste": "Implement a recycling program and compost organic waste.",
+    "default": "Review your energy consumption and identify areas for reduction."
+})
+
 def get_ai_recommendation(activity: str, source_category: str) -> str:
-    recommendations = {
-        "electricity": "Consider installing solar panels to reduce reliance on the grid.",
-        "transport": "Optimize delivery routes and consider using more fuel-efficient vehicles.",
-        "waste": "Implement a recycling program and compost organic waste.",
-        "default": "Review your energy consumption and identify areas for reduction."
-    }
-    return recommendations.get(source_category, recommendations["default"])
+    return _RECOMMENDATIONS.get(source_category, _RECOMMENDATIONS["default"])
+
+# Columns _load_emissions can read and the dtype each is materialized as
+EMISSION_COLUMN_DTYPES = {
+    'business_type': object,
+    'date': object,
+    'source_category': object,
+    'emissions_kgCO2e': np.float64,
+}
+
+def _load_emissions(conn: sqlite3.Connection, business_id: str, user_id: str, columns: tuple) -> dict:
+    """Load the given columns of one business's emission rows as typed NumPy arrays.
+
+    Only the requested columns are selected, so SQLite skips decoding the rest
+    of each record, and pandas' dtype inference is bypassed entirely.
+    """
+    cursor = conn.cursor()
+    cursor.row_factory = None
+    rows = cursor.execute(
+        f"SELECT {', '.join(columns)} FROM emissions WHERE business_id = ? AND user_id = ?", (business_id, user_id)
+    ).fetchall()
+    values = zip(*rows) if rows else [()] * len(columns)
+    return {name: np.array(col, dtype=EMISSION_COLUMN_DTYPES[name]) for name, col in zip(columns, values)}
+
+def _emissions_version(conn: sqlite3.Connection, business_id: str, user_id: str) -> tuple:
+    """Return (row count, highest id) for one business; any insert changes it.
+
+    Served from the (business_id, user_id) index, so it is cheap enough to run
+    before every cached read.
+    """
+    return tuple(conn.execute(
+        "SELECT COUNT(*), MAX(id) FROM emissions WHERE business_id = ? AND user_id = ?", (business_id, user_id)
+    ).fetchone())
+
+# Order defines the category codes passed to _scenario_sum
+SCENARIO_CATEGORIES = ('waste', 'electricity', 'transport', 'commute')
+
+@njit(cache=True, fastmath=True)
+def _scenario_sum(codes, date_idx, emissions, factors_by_code, n_dates):
+    """Scale each row by its category's scenario factor and total it per date index."""
+    sums = np.zeros(n_dates)
+    for i in range(emissions.shape[0]):
+        d = date_idx[i]
+        if d >= 0:
+            sums[d] += emissions[i] * factors_by_code[codes[i]]
+    return sums
+
+def warm_scenario_sum():
+    """Compile _scenario_sum for the dtypes get_forecast uses, outside the request path."""
+    _scenario_sum(
+        np.zeros(1, dtype=np.intp), np.zeros(1, dtype=np.intp),
+        np.zeros(1, dtype=np.float64), np.ones(len(SCENARIO_CATEGORIES) + 1), 1
+    )
+
+def _simple_forecast(ds: pd.Series, y: np.ndarray, periods: int = 12) -> pd.DataFrame:
+    """Least-squares linear trend plus monthly seasonal offsets.
+
+    Returns the same columns Prophet's predict does for the history and the
+    next `periods` month-ends. Seasonality is only added once the history spans
+    two years, mirroring Prophet's default for yearly seasonality.
+    """
+    first, last = ds.min(), ds.max()
+    future_ds = pd.date_range(last, periods=periods + 1, freq=pd.offsets.MonthEnd())
+    future_ds = future_ds[future_ds > last][:periods]
+    all_ds = pd.Series(ds.tolist() + future_ds.tolist())
+
+    x = (all_ds - first).dt.days.to_numpy(dtype=float)
+    n = len(y)
+    A = np.vstack([x[:n], np.ones(n)]).T
+    slope, intercept = np.linalg.lstsq(A, y, rcond=None)[0]
+    yhat = slope * x + intercept
+
+    residuals = y - yhat[:n]
+    if (last - first).days >= 730:
+        months = all_ds.dt.month.to_numpy()
+        seasonal = pd.Series(residuals).groupby(months[:n]).mean()
+        yhat = yhat + pd.Series(months).map(seasonal).fillna(0.0).to_numpy()
+        residuals = y - yhat[:n]
+
+    # The trend fits two parameters, leaving n - 2 degrees of freedom; a 2-point line fits
+    # exactly, so fall back to the data's own spread rather than a zero-width band
+    dof = n - 2
+    spread = np.sqrt((residuals ** 2).sum() / dof) if dof > 0 else y.std(ddof=1)
+    # 80% interval, matching Prophet's default interval_width
+    margin = 1.2816 * spread
+    return pd.DataFrame({'ds': all_ds, 'yhat': yhat, 'yhat_lower': yhat - margin, 'yhat_upper': yhat + margin})
+
+@functools.lru_cache(maxsize=FORECAST_CACHE_SIZE)
+def _fit_and_forecast(ds: tuple, y: tuple) -> list:
+    """Forecast the (ds, y) series 12 months ahead.
+
+    Keyed on the series itself, so repeated requests over unchanged data and the
+    same scenario skip the fit, and any new entry yields a fresh key.
+    The returned records are shared between callers and must not be mutated.
+    """
+    ds = pd.Series(pd.DatetimeIndex(ds))
+    if len(ds) <= SIMPLE_FORECAST_MAX_POINTS:
+        forecast = _simple_forecast(ds, np.asarray(y, dtype=float))
+    else:
+        # Imported lazily: Prophet and its Stan backend are slow to load
+        from prophet import Prophet
+        model = Prophet()
+        model.fit(pd.DataFrame({'ds': ds, 'y': y}))
+        future = model.make_future_dataframe(periods=12, freq=pd.offsets.MonthEnd())
+        forecast = model.predict(future)
+    return forecast[['ds', 'yhat', 'yhat_lower', 'yhat_upper']].to_dict(orient='records')
 
 def convert_naira_to_kwh(amount_naira: float):
     """Placeholder for future implementation."""
     pass
 
-# --- API Endpoints ---
-@app.post("/manual_entry")
-async def manual_entry(entry: ManualEntry, user: DevUser = Depends(current_active_user)):
-    emissions_kgCO2e = entry.amount * entry.emission_factor
-    conn = get_conn()
+# --- Report Rendering ---
+# Fixed pie geometry is built once; only data and labels change per report.
+# ReportLab drawings are mutable, so filling and drawing happens under a lock.
+_pie_drawing = Drawing(400, 200)
+_pie = Pie()
+_pie.x = 150; _pie.y = 50; _pie.width = 150; _pie.height = 150
+_pie_drawing.add(_pie)
+_pie_lock = threading.Lock()
+
+_pdf_buffers = queue.SimpleQueue()
+
+def draw_pie(c, x: float, y: float, data: list, labels: list):
+    with _pie_lock:
+        _pie.data = data
+        _pie.labels = labels
+        _pie_drawing.drawOn(c, x, y)
+
+def acquire_pdf_buffer() -> io.BytesIO:
     try:
-        conn.execute(
+        return _pdf_buffers.get_nowait()
+    except queue.Empty:
+        return io.BytesIO()
+
+def release_pdf_buffer(buffer: io.BytesIO):
+    if _pdf_buffers.qsize() < PDF_BUFFER_POOL_SIZE:
+        buffer.seek(0)
+        buffer.truncate(0)
+        _pdf_buffers.put(buffer)
+
+def stream_pdf_buffer(buffer: io.BytesIO):
+    """Yield the rendered PDF in chunks, returning the buffer to the pool afterwards."""
+    try:
+        buffer.seek(0)
+        while chunk := buffer.read(PDF_STREAM_CHUNK_BYTES):
+            yield chunk
+    finally:
+        release_pdf_buffer(buffer)
+
+# --- API Endpoints ---
+def _insert_manual_entry(entry: ManualEntry, user_id: str) -> float:
+    with get_conn() as conn, conn:
+        # emissions_kgCO2e is generated by SQLite; read it back rather than recomputing it
+        row = conn.execute(
             """
-            INSERT INTO emissions (business_id, business_type, date, source_category, activity, amount, unit, emission_factor, emissions_kgCO2e, scope, user_id)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            INSERT INTO emissions (business_id, business_type, date, source_category, activity, amount, unit, emission_factor, scope, user_id)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            RETURNING emissions_kgCO2e
             """,
-            (entry.business_id, entry.business_type, entry.date, entry.source_category, entry.activity, entry.amount, entry.unit, entry.emission_factor, emissions_kgCO2e, entry.scope, str(user.id))
-        )
-        conn.commit()
-    finally:
-        conn.close()
+            (entry.business_id, entry.business_type, entry.date, entry.source_category, entry.activity, entry.amount, entry.unit, entry.emission_factor, entry.scope, user_id)
+        ).fetchone()
+    # RETURNING hands back integral REAL values as int
+    return float(row['emissions_kgCO2e'])
+
+@app.post("/manual_entry")
+async def manual_entry(entry: ManualEntry, user: DevUser = Depends(current_active_user)):
+    emissions_kgCO2e = await run_in_threadpool(_insert_manual_entry, entry, str(user.id))
     return {"message": "Manual entry added successfully", "emissions_kgCO2e": emissions_kgCO2e}
 
-@app.post("/upload")
-async def upload_csv(file: UploadFile = File(...), user: DevUser = Depends(current_active_user)):
+def _insert_csv_rows(csv_file, user_id: str) -> int:
     required_columns = [
         'business_id', 'business_type', 'date', 'source_category', 'activity',
         'amount', 'unit', 'emission_factor', 'scope'
     ]
     
-    contents = await file.read()
-    df = pd.read_csv(io.StringIO(contents.decode('utf-8')))
+    # Everything is parsed as text; the numeric columns are converted per chunk below
+    dtypes = {col: str for col in required_columns}
+    # emissions_kgCO2e is a generated column, so only the inputs and the owner are inserted
+    final_columns = required_columns + ['user_id']
+    insert_sql = f"INSERT INTO emissions ({', '.join(final_columns)}) VALUES ({', '.join('?' * len(final_columns))})"
 
-    if not all(col in df.columns for col in required_columns):
+    try:
+        reader = pd.read_csv(csv_file, encoding='utf-8', usecols=required_columns, dtype=dtypes, chunksize=UPLOAD_CHUNK_ROWS)
+    except UnicodeDecodeError:
+        raise HTTPException(status_code=400, detail="CSV file must be UTF-8 encoded")
+    except pd.errors.EmptyDataError:
+        raise HTTPException(status_code=400, detail="CSV file is empty")
+    except pd.errors.ParserError:
+        raise HTTPException(status_code=400, detail="CSV file is malformed")
+    except ValueError:
         raise HTTPException(status_code=400, detail=f"Missing required columns. Required: {required_columns}")
 
-    df['emissions_kgCO2e'] = df['amount'] * df['emission_factor']
-    df['user_id'] = str(user.id)
+    row_count = 0
+    try:
+        with reader, get_conn() as conn, conn:
+            for chunk in reader:
+                try:
+                    chunk = chunk.astype({'amount': 'float64', 'emission_factor': 'float64'})
+                except ValueError:
+                    raise HTTPException(status_code=400, detail="Columns 'amount' and 'emission_factor' must be numeric")
+                chunk['user_id'] = user_id
+                chunk = chunk[final_columns]
+                # Box to plain Python values (NaN -> NULL) so sqlite3 can bind every cell
+                conn.executemany(insert_sql, chunk.astype(object).where(chunk.notna(), None).itertuples(index=False, name=None))
+                row_count += len(chunk)
+    except UnicodeDecodeError:
+        raise HTTPException(status_code=400, detail="CSV file must be UTF-8 encoded")
+    except pd.errors.ParserError:
+        raise HTTPException(status_code=400, detail="CSV file is malformed")
     
-    # Ensure all 10 columns are present for the database
-    final_columns = required_columns + ['emissions_kgCO2e', 'user_id']
-    df = df[final_columns]
+    return row_count
 
-    conn = get_conn()
-    try:
-        df.to_sql('emissions', conn, if_exists='replace', index=False)
-    finally:
-        conn.close()
+@app.post("/upload")
+async def upload_csv(file: UploadFile = File(...), user: DevUser = Depends(current_active_user)):
+    row_count = await run_in_threadpool(_insert_csv_rows, file.file, str(user.id))
+    return {"message": "Data uploaded successfully", "rows": row_count}
+
+@functools.lru_cache(maxsize=SUMMARY_CACHE_SIZE)
+def _dashboard_cached(business_id: str, user_id: str, version: tuple) -> dict:
+    """Aggregate the dashboard; `version` only keys the cache. The result is shared and must not be mutated."""
+    params = (business_id, user_id)
+    with get_conn() as conn:
+        total_emissions = conn.execute(
+            "SELECT TOTAL(emissions_kgCO2e) FROM emissions WHERE business_id = ? AND user_id = ?", params
+        ).fetchone()[0]
+        contributors = conn.execute(
+            "SELECT source_category, TOTAL(emissions_kgCO2e) AS emissions_kgCO2e FROM emissions WHERE business_id = ? AND user_id = ? AND source_category IS NOT NULL GROUP BY source_category", params
+        ).fetchall()
+        by_scope = conn.execute(
+            "SELECT scope, TOTAL(emissions_kgCO2e) AS emissions_kgCO2e FROM emissions WHERE business_id = ? AND user_id = ? AND scope IS NOT NULL GROUP BY scope", params
+        ).fetchall()
     
-    return {"message": "Data uploaded and replaced successfully", "rows": len(df)}
+    avg_monthly = float(total_emissions / 12)
+
+    return {
+        "total_emissions": float(total_emissions),
+        "avg_monthly_emissions": avg_monthly,
+        "contributors": [dict(row) for row in contributors],
+        "by_scope": [dict(row) for row in by_scope]
+    }
+
+def _build_dashboard(business_id: str, user_id: str) -> dict:
+    with get_conn() as conn:
+        version = _emissions_version(conn, business_id, user_id)
+    if version[0] == 0:
+        raise HTTPException(status_code=404, detail="No data found for this business")
+    return _dashboard_cached(business_id, user_id, version)
 
 @app.get("/dashboard/{business_id}")
 async def get_dashboard(business_id: str, user: DevUser = Depends(current_active_user)):
-    conn = get_conn()
-    try:
-        df = pd.read_sql_query("SELECT * FROM emissions WHERE business_id = ? AND user_id = ?", conn, params=(business_id, str(user.id)))
-        if df.empty:
-            raise HTTPException(status_code=404, detail="No data found for this business")
-        
-        total_emissions = float(df['emissions_kgCO2e'].sum())
-        avg_monthly = float(total_emissions / 12)
-        
-        contributors = df.groupby('source_category')['emissions_kgCO2e'].sum().reset_index()
-        by_scope = df.groupby('scope')['emissions_kgCO2e'].sum().reset_index()
-
-        return {
-            "total_emissions": total_emissions,
-            "avg_monthly_emissions": avg_monthly,
-            "contributors": contributors.to_dict(orient='records'),
-            "by_scope": by_scope.to_dict(orient='records')
-        }
-    finally:
-        conn.close()
+    return await run_in_threadpool(_build_dashboard, business_id, str(user.id))
 
-@app.get("/insights/{business_id}")
-async def get_insights(business_id: str, user: DevUser = Depends(current_active_user)):
-    conn = get_conn()
-    try:
-        df_business = pd.read_sql_query("SELECT * FROM emissions WHERE business_id = ? AND user_id = ?", conn, params=(business_id, str(user.id)))
-        if df_business.empty:
-            raise HTTPException(status_code=404, detail="No data found for this business")
+@functools.lru_cache(maxsize=SUMMARY_CACHE_SIZE)
+def _insights_cached(business_id: str, user_id: str, version: tuple) -> dict:
+    """Score the business against its sector; `version` only keys the cache."""
+    with get_conn() as conn:
+        row = conn.execute(
+            """
+            WITH biz AS (
+                SELECT TOTAL(emissions_kgCO2e) AS total_emissions,
+                       (SELECT business_type FROM emissions WHERE business_id = :business_id AND user_id = :user_id ORDER BY id LIMIT 1) AS business_type
+                FROM emissions WHERE business_id = :business_id AND user_id = :user_id
+            ),
+            sector AS (
+                SELECT AVG(s) AS avg_sector_emissions FROM (
+                    SELECT TOTAL(emissions_kgCO2e) AS s FROM emissions
+                    WHERE business_type = (SELECT business_type FROM biz)
+                    GROUP BY business_id
+                )
+            ),
+            top AS (
+                SELECT activity, source_category, TOTAL(emissions_kgCO2e) AS e FROM emissions
+                WHERE business_id = :business_id AND user_id = :user_id
+                GROUP BY activity ORDER BY e DESC, activity LIMIT 1
+            )
+            SELECT * FROM biz, sector, top;
+            """,
+            {"business_id": business_id, "user_id": user_id}
+        ).fetchone()
+    if row is None:
+        raise HTTPException(status_code=404, detail="No data found for this business")
 
-        business_type = df_business['business_type'].iloc[0]
-        total_emissions = df_business['emissions_kgCO2e'].sum()
+    total_emissions = row['total_emissions']
+    avg_sector_emissions = row['avg_sector_emissions']
 
-        df_sector = pd.read_sql_query("SELECT * FROM emissions WHERE business_type = ?", conn, params=(business_type,))
-        avg_sector_emissions = df_sector.groupby('business_id')['emissions_kgCO2e'].sum().mean()
+    green_score = (1 - (total_emissions / avg_sector_emissions)) * 100 if avg_sector_emissions and avg_sector_emissions > 0 else 100
+    green_score = max(0, min(100, green_score))
 
-        green_score = (1 - (total_emissions / avg_sector_emissions)) * 100 if avg_sector_emissions > 0 else 100
-        green_score = max(0, min(100, green_score))
+    recommendation = get_ai_recommendation(row['activity'], row['source_category'])
 
-        top_activity = df_business.groupby('activity')['emissions_kgCO2e'].sum().idxmax()
-        top_source_category = df_business.loc[df_business['activity'] == top_activity, 'source_category'].iloc[0]
-        
-        recommendation = get_ai_recommendation(top_activity, top_source_category)
+    return {
+        "green_score": green_score,
+        "recommendation": recommendation,
+        "explanation": "Based on Nigerian grid emission factors (0.359 kgCO₂/kWh) and fuel standards, your business emissions are interpreted according to local energy and waste conditions."
+    }
 
-        return {
-            "green_score": green_score,
-            "recommendation": recommendation,
-            "explanation": "Based on Nigerian grid emission factors (0.359 kgCO₂/kWh) and fuel standards, your business emissions are interpreted according to local energy and waste conditions."
-        }
-    finally:
-        conn.close()
+def _build_insights(business_id: str, user_id: str) -> dict:
+    with get_conn() as conn:
+        version = _emissions_version(conn, business_id, user_id)
+        # The sector average spans other businesses, so any insert anywhere invalidates it
+        latest_id = conn.execute("SELECT MAX(id) FROM emissions").fetchone()[0]
+    if version[0] == 0:
+        raise HTTPException(status_code=404, detail="No data found for this business")
+    return _insights_cached(business_id, user_id, (version, latest_id))
+
+@app.get("/insights/{business_id}")
+async def get_insights(business_id: str, user: DevUser = Depends(current_active_user)):
+    return await run_in_threadpool(_build_insights, business_id, str(user.id))
+
+def _build_forecast(business_id: str, user_id: str, scenario: ScenarioRequest) -> dict:
+    with get_conn() as conn:
+        data = _load_emissions(conn, business_id, user_id, ('date', 'source_category', 'emissions_kgCO2e'))
+    if len(data['date']) == 0:
+        raise HTTPException(status_code=400, detail="Not enough data for forecast")
+    
+    categories = data['source_category']
+    dates = data['date']
+    emissions = data['emissions_kgCO2e']
+    if scenario.source_category != 'all':
+        mask = categories == scenario.source_category
+        categories, dates, emissions = categories[mask], dates[mask], emissions[mask]
+
+    # Code 0 is "no scenario adjustment"; known categories are shifted up by one
+    codes = pd.Index(SCENARIO_CATEGORIES).get_indexer(categories) + 1
+    # Normalize 'YYYY-MM' and 'YYYY-MM-DD' spellings to one timestamp per real date;
+    # unparseable or missing dates become NaT and are skipped by _scenario_sum
+    date_idx, dates = pd.factorize(pd.to_datetime(dates, format='mixed', errors='coerce'), sort=True)
+    factors_by_code = np.array([
+        1.0,
+        1 - scenario.waste_reduction / 100,
+        1 - scenario.solar_percentage / 100,
+        1 - scenario.transport_reduction / 100,
+        1 - scenario.commute_reduction / 100,
+    ])
+    daily_totals = _scenario_sum(codes, date_idx, np.nan_to_num(emissions), factors_by_code, len(dates))
+    
+    if len(dates) < 2:
+        raise HTTPException(status_code=400, detail="Not enough data for forecast")
+
+    forecast = _fit_and_forecast(tuple(dates), tuple(daily_totals.tolist()))
+    
+    return {
+        "forecast": forecast
+    }
 
 @app.post("/forecast/{business_id}")
 async def get_forecast(business_id: str, scenario: ScenarioRequest, user: DevUser = Depends(current_active_user)):
-    conn = get_conn()
-    try:
-        df = pd.read_sql_query("SELECT * FROM emissions WHERE business_id = ? AND user_id = ?", conn, params=(business_id, str(user.id)))
-        if df.empty:
-            raise HTTPException(status_code=400, detail="Not enough data for forecast")
-        
-        sim_data = df.copy()
-        sim_data.loc[sim_data['source_category'] == 'waste', 'emissions_kgCO2e'] *= (1 - scenario.waste_reduction / 100)
-        sim_data.loc[sim_data['source_category'] == 'electricity', 'emissions_kgCO2e'] *= (1 - scenario.solar_percentage / 100)
-        sim_data.loc[sim_data['source_category'] == 'transport', 'emissions_kgCO2e'] *= (1 - scenario.transport_reduction / 100)
-        sim_data.loc[sim_data['source_category'] == 'commute', 'emissions_kgCO2e'] *= (1 - scenario.commute_reduction / 100)
-        
-        df_filtered = sim_data if scenario.source_category == 'all' else sim_data[sim_data['source_category'] == scenario.source_category]
-        df_prophet = df_filtered.groupby('date')['emissions_kgCO2e'].sum().reset_index().rename(columns={'date': 'ds', 'emissions_kgCO2e': 'y'})
-        
-        if len(df_prophet) < 2:
-            raise HTTPException(status_code=400, detail="Not enough data for forecast")
+    return await run_in_threadpool(_build_forecast, business_id, str(user.id), scenario)
+
+@functools.lru_cache(maxsize=SUMMARY_CACHE_SIZE)
+def _report_data_cached(business_id: str, user_id: str, version: tuple) -> tuple:
+    """Aggregate the figures a report prints; `version` only keys the cache."""
+    with get_conn() as conn:
+        data = _load_emissions(conn, business_id, user_id, ('business_type', 'source_category', 'emissions_kgCO2e'))
+
+    business_type = data['business_type'][0]
+    emissions = np.nan_to_num(data['emissions_kgCO2e'])
+    total_emissions = emissions.sum()
+    avg_monthly = total_emissions / 12
+    
+    category_idx, categories = pd.factorize(data['source_category'], sort=True)
+    has_category = category_idx >= 0
+    category_totals = np.bincount(category_idx[has_category], weights=emissions[has_category], minlength=len(categories))
+    top_category = categories[category_totals.argmax()]
+    recommendation = get_ai_recommendation("", top_category)
+    return business_type, total_emissions, avg_monthly, tuple(categories.tolist()), tuple(category_totals.tolist()), recommendation
+
+def _render_pdf_report(business_id: str, user_id: str) -> io.BytesIO:
+    with get_conn() as conn:
+        version = _emissions_version(conn, business_id, user_id)
+    if version[0] == 0:
+        raise HTTPException(status_code=404, detail="No data found for report")
+    business_type, total_emissions, avg_monthly, categories, category_totals, recommendation = _report_data_cached(business_id, user_id, version)
+
+    buffer = acquire_pdf_buffer()
+    c = canvas.Canvas(buffer, pagesize=letter)
+    c.setFont("Helvetica", 12)
+    c.drawString(100, 750, f"EcoImpact Report for {business_id} ({business_type})")
+    c.drawString(100, 730, f"Total Annual Emissions: {total_emissions:.2f} kgCO2e")
+    c.drawString(100, 710, f"Average Monthly Emissions: {avg_monthly:.2f} kgCO2e")
+    
+    y = 690
+    c.drawString(100, y, "Top Emission Sources:")
+    y -= 20
+    for category, category_total in zip(categories, category_totals):
+        c.drawString(120, y, f"{category}: {category_total:.2f} kgCO2e")
+        y -= 20
+    
+    c.drawString(100, y-20, "Recommendation:")
+    c.drawString(120, y-40, f"- {recommendation}")
 
-        model = Prophet()
-        model.fit(df_prophet)
-        future = model.make_future_dataframe(periods=12, freq='M')
-        forecast = model.predict(future)
-        
-        return {
-            "forecast": forecast[['ds', 'yhat', 'yhat_lower', 'yhat_upper']].to_dict(orient='records')
-        }
-    finally:
-        conn.close()
+    draw_pie(c, 100, y-300, list(category_totals), list(categories))
+    
+    c.showPage()
+    c.save()
+    return buffer
 
 @app.get("/report/{business_id}")
 async def generate_pdf_report(business_id: str, user: DevUser = Depends(current_active_user)):
-    conn = get_conn()
-    try:
-        df = pd.read_sql_query("SELECT * FROM emissions WHERE business_id = ? AND user_id = ?", conn, params=(business_id, str(user.id)))
-        if df.empty:
-            raise HTTPException(status_code=404, detail="No data found for report")
-
-        business_type = df['business_type'].iloc[0]
-        total_emissions = df['emissions_kgCO2e'].sum()
-        avg_monthly = total_emissions / 12
-        
-        contributors = df.groupby('source_category')['emissions_kgCO2e'].sum().reset_index()
-        top_category = contributors.loc[contributors['emissions_kgCO2e'].idxmax(), 'source_category']
-        recommendation = get_ai_recommendation("", top_category)
-
-        buffer = io.BytesIO()
-        c = canvas.Canvas(buffer, pagesize=letter)
-        c.setFont("Helvetica", 12)
-        c.drawString(100, 750, f"EcoImpact Report for {business_id} ({business_type})")
-        c.drawString(100, 730, f"Total Annual Emissions: {total_emissions:.2f} kgCO2e")
-        c.drawString(100, 710, f"Average Monthly Emissions: {avg_monthly:.2f} kgCO2e")
-        
-        y = 690
-        c.drawString(100, y, "Top Emission Sources:")
-        y -= 20
-        for _, row in contributors.iterrows():
-            c.drawString(120, y, f"{row['source_category']}: {row['emissions_kgCO2e']:.2f} kgCO2e")
-            y -= 20
-        
-        c.drawString(100, y-20, "Recommendation:")
-        c.drawString(120, y-40, f"- {recommendation}")
-
-        drawing = Drawing(400, 200)
-        pie = Pie()
-        pie.x = 150; pie.y = 50; pie.width = 150; pie.height = 150
-        pie.data = contributors['emissions_kgCO2e'].tolist()
-        pie.labels = contributors['source_category'].tolist()
-        drawing.add(pie)
-        drawing.drawOn(c, 100, y-300)
-        
-        c.showPage()
-        c.save()
-        # NOTE: Ensured the Response class is imported at the top of the file
-        return Response(content=buffer.getvalue(), media_type="application/pdf", headers={"Content-Disposition": f"attachment;filename=report_{business_id}.pdf"})
-    finally:
-        conn.close()
+    buffer = await run_in_threadpool(_render_pdf_report, business_id, str(user.id))
+    return StreamingResponse(stream_pdf_buffer(buffer), media_type="application/pdf", headers={"Content-Disposition": f"attachment;filename=report_{business_id}.pdf"})
 
 if __name__ == "__main__":
-    uvicorn.run("backend:app", host="0.0.0.0", port=int(os.getenv("PORT", 8000)), reload=True)
+    # Auto-reload is for local development only and cannot be combined with multiple workers
+    reload = os.getenv("RELOAD", "").lower() in ("1", "true", "yes")
+    uvicorn.run(
+        "backend:app",
+        host="0.0.0.0",
+        port=int(os.getenv("PORT", 8000)),
+        # loop/http stay on "auto", which picks uvloop and httptools when they are installed
+        workers=1 if reload else int(os.getenv("WORKERS", os.cpu_count() or 1)),
+        reload=reload,
+    )